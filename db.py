@@ -1,6 +1,6 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
 from dotenv import load_dotenv
 from urllib.parse import urlsplit, parse_qs, urlunsplit
@@ -13,11 +13,15 @@ if not DATABASE_URL:
     # fallback to a local sqlite for development if not configured
     DATABASE_URL = "sqlite:///./local.db"
 
-# If the URL uses the generic mysql:// scheme, prefer the pymysql driver
-# which is pure-Python and already listed in requirements.txt. Otherwise
-# SQLAlchemy may try to import MySQLdb (mysqlclient) which may not be installed.
+# The app runs on an async engine, so map the common sync URL schemes to the
+# async drivers listed in requirements.txt (aiomysql / aiosqlite). URLs from
+# older .env files that explicitly name pymysql are rewritten too.
 if DATABASE_URL.startswith("mysql://"):
-    DATABASE_URL = DATABASE_URL.replace("mysql://", "mysql+pymysql://", 1)
+    DATABASE_URL = DATABASE_URL.replace("mysql://", "mysql+aiomysql://", 1)
+elif DATABASE_URL.startswith("mysql+pymysql://"):
+    DATABASE_URL = DATABASE_URL.replace("mysql+pymysql://", "mysql+aiomysql://", 1)
+if DATABASE_URL.startswith("sqlite:///"):
+    DATABASE_URL = DATABASE_URL.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
 
 # Some provider URLs (e.g. Aiven) append query parameters like `ssl-mode=REQUIRED`.
 # SQLAlchemy will pass these as keyword args to the DBAPI connect function which
@@ -31,9 +35,10 @@ try:
         # handle ssl-mode → pass an ssl dict to pymysql (empty dict requests TLS)
         ssl_mode = qs.get("ssl-mode") or qs.get("ssl_mode")
         if ssl_mode:
-            # instruct pymysql to use SSL/TLS; an empty dict is commonly accepted
-            # to enable TLS when the server requires it. If your provider needs CA
-            # files, adjust to pass {'ca': '/path/to/ca.pem'} here.
+            # instruct the driver to use SSL/TLS; an empty dict is commonly
+            # accepted to enable TLS when the server requires it. If your
+            # provider needs CA files, adjust to pass
+            # {'ca': '/path/to/ca.pem'} here.
             connect_args["ssl"] = {}
 
         # rebuild URL without the query portion so SQLAlchemy doesn't forward
@@ -43,14 +48,55 @@ except Exception:
     # if parsing fails, continue with the original DATABASE_URL
     pass
 
-# create engine
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, connect_args=connect_args)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# create engine. Pool tuning targets server databases (MySQL): a larger pool
+# raises the concurrency ceiling under multiple workers, pool_recycle keeps
+# connections younger than the server's wait_timeout so the pool never hands
+# out sockets the server already dropped, and pool_use_lifo prefers the most
+# recently returned (still-hot) connection. The sqlite dev fallback keeps
+# the default pool.
+engine_kwargs = {"pool_pre_ping": True, "connect_args": connect_args}
+if not DATABASE_URL.startswith("sqlite"):
+    engine_kwargs.update(
+        pool_size=20,
+        max_overflow=10,
+        pool_recycle=1800,
+        pool_use_lifo=True,
+    )
+engine = create_async_engine(DATABASE_URL, **engine_kwargs)
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 
 
-def init_db(Base):
+async def init_db(Base):
     """Create tables. Call with schema.Base."""
     try:
-        Base.metadata.create_all(bind=engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
     except SQLAlchemyError:
         raise
+
+    # Indexes declared after a table already exists aren't created by
+    # create_all() either; create any missing ones explicitly.
+    async with engine.connect() as conn:
+        for table in Base.metadata.tables.values():
+            for index in table.indexes:
+                try:
+                    await conn.run_sync(index.create, checkfirst=True)
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+
+    # Lightweight in-place migration: databases created before `name_lower`
+    # was added won't get the column from create_all() (it never alters
+    # existing tables), so add and backfill it best-effort here.
+    async with engine.connect() as conn:
+        try:
+            await conn.execute(text("ALTER TABLE countries ADD COLUMN name_lower VARCHAR(255)"))
+            await conn.commit()
+        except Exception:
+            # column already exists
+            await conn.rollback()
+        try:
+            await conn.execute(text("UPDATE countries SET name_lower = LOWER(name) WHERE name_lower IS NULL"))
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
@@ -5,6 +5,7 @@ from sqlalchemy import (
     Float,
     DateTime,
     func,
+    Index,
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import text
@@ -19,15 +20,27 @@ class Country(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(255), nullable=False, unique=True, index=True)
+    # lowercase copy of `name` so case-insensitive lookups can use an index
+    # instead of a non-sargable LOWER(name) scan
+    name_lower = Column(String(255), nullable=False, unique=True, index=True)
     capital = Column(String(255), nullable=True)
-    region = Column(String(255), nullable=True)
+    region = Column(String(255), nullable=True, index=True)
     population = Column(Integer, nullable=False)
-    currency_code = Column(String(16), nullable=True)
+    currency_code = Column(String(16), nullable=True, index=True)
     exchange_rate = Column(Float, nullable=True)
     estimated_gdp = Column(Float, nullable=True)
     flag_url = Column(String(1024), nullable=True)
     last_refreshed_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    # ix_country_gdp_desc supports the ORDER BY estimated_gdp DESC LIMIT 5 in
+    # the summary image and the gdp sort options on /countries without a
+    # filesort; the composite index covers listings filtered on both region
+    # and currency at once
+    __table_args__ = (
+        Index("ix_country_gdp_desc", estimated_gdp.desc()),
+        Index("ix_country_region_currency", region, currency_code),
+    )
+
 
 class Meta(Base):
     __tablename__ = "meta"
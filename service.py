@@ -1,9 +1,35 @@
-import requests
+from pathlib import Path
 from typing import Tuple
 
+from requests.adapters import HTTPAdapter
+from requests_cache import CachedSession
+from urllib3.util.retry import Retry
+
 COUNTRIES_API = "https://restcountries.com/v2/all?fields=name,capital,region,population,flag,currencies"
 EXCHANGE_RATE_API = "https://open.er-api.com/v6/latest/USD"
 
+# Cache external API responses for an hour so repeated refreshes don't
+# re-download a few hundred KB of unchanged JSON. cache_control=True lets
+# the session revalidate with If-None-Match/If-Modified-Since (cheap 304s).
+Path("cache").mkdir(exist_ok=True)
+_session = CachedSession(
+    "cache/http_cache",
+    backend="sqlite",
+    expire_after=3600,
+    cache_control=True,
+)
+# Long-lived session already amortizes the TLS handshake across calls; the
+# adapter adds a small connection pool and automatic retries on transient
+# 5xx responses so one hiccup upstream doesn't turn a refresh into a 503.
+_session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=4,
+        max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+    ),
+)
+
 
 def fetch_countries(timeout: int = 10) -> Tuple[bool, dict]:
     """Fetches countries from the external API.
@@ -11,7 +37,7 @@ def fetch_countries(timeout: int = 10) -> Tuple[bool, dict]:
     Returns (success, json) where success is False when request failed.
     """
     try:
-        r = requests.get(COUNTRIES_API, timeout=timeout)
+        r = _session.get(COUNTRIES_API, timeout=timeout)
         r.raise_for_status()
         return True, r.json()
     except Exception as e:
@@ -20,7 +46,7 @@ def fetch_countries(timeout: int = 10) -> Tuple[bool, dict]:
 
 def fetch_exchange_rates(timeout: int = 10) -> Tuple[bool, dict]:
     try:
-        r = requests.get(EXCHANGE_RATE_API, timeout=timeout)
+        r = _session.get(EXCHANGE_RATE_API, timeout=timeout)
         r.raise_for_status()
         return True, r.json()
     except Exception as e: